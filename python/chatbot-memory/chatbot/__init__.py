@@ -1,3 +1,4 @@
-from .db import ChatDatabase
+from .db import ChatDatabase, EMBEDDING_MODEL, EMBEDDING_DIM
+from .async_db import AsyncChatDatabase
 
-__all__ = ["ChatDatabase"]
\ No newline at end of file
+__all__ = ["ChatDatabase", "AsyncChatDatabase", "EMBEDDING_MODEL", "EMBEDDING_DIM"]
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
+
+from . import queries
+
+
+async def _configure_connection(conn: psycopg.AsyncConnection) -> None:
+    """Register pgvector types once when the pool opens a new connection."""
+    await register_vector_async(conn)
+    # The pool requires connections to be returned idle
+    await conn.commit()
+
+
+class AsyncChatDatabase:
+    """Async counterpart of ChatDatabase for use inside FastAPI handlers."""
+
+    def __init__(self):
+        self.connection_string = os.environ["CHAT_DATABASE_URL"]
+        # Opened from the application's lifespan, once an event loop is running
+        self.pool = AsyncConnectionPool(
+            self.connection_string,
+            min_size=2,
+            max_size=20,
+            # Bound the wait queue so a burst fails fast instead of piling up
+            max_waiting=100,
+            timeout=5,
+            configure=_configure_connection,
+            open=False,
+        )
+
+    async def open(self):
+        """Open the connection pool."""
+        await self.pool.open()
+
+    async def close(self):
+        """Close all pooled connections."""
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def get_cursor(self):
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                yield cursor
+                await conn.commit()
+
+    @asynccontextmanager
+    async def get_ro_cursor(self):
+        """Cursor for read-only queries; autocommit skips the COMMIT round-trip."""
+        async with self.pool.connection() as conn:
+            await conn.set_autocommit(True)
+            try:
+                async with conn.cursor(row_factory=dict_row) as cursor:
+                    yield cursor
+            finally:
+                await conn.set_autocommit(False)
+
+    async def create_conversation(self) -> int:
+        """Create a new conversation and return its ID."""
+        async with self.get_cursor() as cursor:
+            await cursor.execute(queries.CREATE_CONVERSATION)
+            return (await cursor.fetchone())["id"]
+
+    async def add_message(self, conversation_id: int, role: str, content: str) -> int:
+        """Add a message to a conversation and bump its updated_at in one round-trip."""
+        async with self.get_cursor() as cursor:
+            await cursor.execute(
+                queries.ADD_MESSAGE,
+                (conversation_id, role, content, conversation_id),
+                prepare=True
+            )
+            return (await cursor.fetchone())["id"]
+
+    async def get_conversation_history(self, conversation_id: int, limit: Optional[int] = None, before_id: Optional[int] = None, exclude_last: bool = False) -> List[Dict]:
+        """Get messages in a conversation, optionally limited to the most recent before a message.
+
+        With exclude_last, the newest message (typically the one being answered) is skipped.
+        """
+        query, params = queries.conversation_history_query(conversation_id, limit, before_id, exclude_last)
+        async with self.get_ro_cursor() as cursor:
+            await cursor.execute(query, params, prepare=True)
+            return await cursor.fetchall()
+
+    async def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
+        """Get recent conversations with message count."""
+        async with self.get_ro_cursor() as cursor:
+            await cursor.execute(queries.RECENT_CONVERSATIONS, (limit,))
+            return await cursor.fetchall()
+
+    async def get_all_memories(self) -> List[Dict]:
+        """Get all memories across all conversations, newest first."""
+        async with self.get_ro_cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT id, fact, created_at, conversation_id
+                FROM memories
+                ORDER BY created_at DESC
+                """
+            )
+            return await cursor.fetchall()
+
+    async def delete_memory(self, memory_id: int) -> bool:
+        """Delete a memory by ID."""
+        async with self.get_cursor() as cursor:
+            await cursor.execute(queries.DELETE_MEMORY, (memory_id,))
+            return cursor.rowcount > 0
+
+    async def delete_conversation(self, conversation_id: int) -> bool:
+        """Delete a conversation and all its messages in a single statement."""
+        async with self.get_cursor() as cursor:
+            # Memories are kept - they persist across conversations
+            await cursor.execute(
+                """
+                WITH existing AS (
+                    SELECT id FROM conversations WHERE id = %s
+                ), deleted_messages AS (
+                    DELETE FROM messages WHERE conversation_id IN (SELECT id FROM existing)
+                )
+                DELETE FROM conversations WHERE id IN (SELECT id FROM existing)
+                RETURNING id
+                """,
+                (conversation_id,)
+            )
+            return await cursor.fetchone() is not None
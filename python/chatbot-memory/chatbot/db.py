@@ -1,112 +1,125 @@
 import os
+import threading
 from contextlib import contextmanager
 from typing import List, Dict, Optional
 import numpy as np
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from pgvector.psycopg import register_vector
 
+from . import queries
+
+# Embedding settings shared by the worker and scripts; EMBEDDING_DIM must match
+# the memories.embedding column in schema.sql. Embeddings are stored as halfvec
+# (float16), halving storage and index size with negligible recall loss.
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 512
+
+
+def _configure_connection(conn: psycopg.Connection) -> None:
+    """Register pgvector types once when the pool opens a new connection."""
+    register_vector(conn)
+    # The pool requires connections to be returned idle
+    conn.commit()
+
 
 class ChatDatabase:
     def __init__(self):
         self.connection_string = os.environ["CHAT_DATABASE_URL"]
+        # Reuse connections across requests instead of reconnecting per cursor.
+        # The pool opens on first use, so processes that only import this module
+        # (e.g. the API importing tasks to enqueue work) hold no connections.
+        self.pool = ConnectionPool(
+            self.connection_string,
+            min_size=2,
+            max_size=20,
+            # Bound the wait queue so a burst fails fast instead of piling up
+            max_waiting=100,
+            timeout=5,
+            configure=_configure_connection,
+            open=False,
+        )
+        self._open_lock = threading.Lock()
+        self._opened = False
+    
+    def open(self):
+        """Open the connection pool if it isn't open yet."""
+        with self._open_lock:
+            if not self._opened:
+                self.pool.open()
+                self._opened = True
     
     @contextmanager
     def get_cursor(self):
-        with psycopg.connect(self.connection_string) as conn:
-            # Register pgvector extension
-            register_vector(conn)
+        if not self._opened:
+            self.open()
+        with self.pool.connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 yield cursor
                 conn.commit()
     
+    @contextmanager
+    def get_ro_cursor(self):
+        """Cursor for read-only queries; autocommit skips the COMMIT round-trip."""
+        if not self._opened:
+            self.open()
+        with self.pool.connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor(row_factory=dict_row) as cursor:
+                    yield cursor
+            finally:
+                conn.autocommit = False
+    
+    def close(self):
+        """Close all pooled connections."""
+        self.pool.close()
+    
     def create_conversation(self) -> int:
         """Create a new conversation and return its ID."""
         with self.get_cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO conversations DEFAULT VALUES RETURNING id"
-            )
+            cursor.execute(queries.CREATE_CONVERSATION)
             return cursor.fetchone()["id"]
     
     def add_message(self, conversation_id: int, role: str, content: str) -> int:
-        """Add a message to a conversation."""
+        """Add a message to a conversation and bump its updated_at in one round-trip."""
         with self.get_cursor() as cursor:
+            # Hot statements (here, in get_conversation_history and the memory searches)
+            # use prepare=True so they are planned once per pooled connection
             cursor.execute(
-                """
-                INSERT INTO messages (conversation_id, role, content)
-                VALUES (%s, %s, %s)
-                RETURNING id
-                """,
-                (conversation_id, role, content)
-            )
-            message_id = cursor.fetchone()["id"]
-            
-            # Update conversation's updated_at
-            cursor.execute(
-                "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                (conversation_id,)
+                queries.ADD_MESSAGE,
+                (conversation_id, role, content, conversation_id),
+                prepare=True
             )
-            
-            return message_id
+            return cursor.fetchone()["id"]
     
-    def get_conversation_history(self, conversation_id: int, limit: Optional[int] = None) -> List[Dict]:
-        """Get messages in a conversation, optionally limited to most recent."""
-        with self.get_cursor() as cursor:
-            if limit:
-                # Get the most recent N messages
-                cursor.execute(
-                    """
-                    SELECT * FROM (
-                        SELECT id, role, content, created_at
-                        FROM messages
-                        WHERE conversation_id = %s
-                        ORDER BY created_at DESC
-                        LIMIT %s
-                    ) AS recent_messages
-                    ORDER BY created_at ASC
-                    """,
-                    (conversation_id, limit)
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT id, role, content, created_at
-                    FROM messages
-                    WHERE conversation_id = %s
-                    ORDER BY created_at ASC
-                    """,
-                    (conversation_id,)
-                )
+    def get_conversation_history(self, conversation_id: int, limit: Optional[int] = None, before_id: Optional[int] = None, exclude_last: bool = False) -> List[Dict]:
+        """Get messages in a conversation, optionally limited to the most recent before a message.
+        
+        With exclude_last, the newest message (typically the one being answered) is skipped.
+        """
+        query, params = queries.conversation_history_query(conversation_id, limit, before_id, exclude_last)
+        with self.get_ro_cursor() as cursor:
+            cursor.execute(query, params, prepare=True)
             return cursor.fetchall()
     
     def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
         """Get recent conversations with message count."""
-        with self.get_cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT 
-                    c.id,
-                    c.created_at,
-                    c.updated_at,
-                    COUNT(m.id) as message_count,
-                    MAX(m.content) FILTER (WHERE m.role = 'user') as last_user_message
-                FROM conversations c
-                LEFT JOIN messages m ON c.id = m.conversation_id
-                GROUP BY c.id
-                ORDER BY c.updated_at DESC
-                LIMIT %s
-                """,
-                (limit,)
-            )
+        with self.get_ro_cursor() as cursor:
+            cursor.execute(queries.RECENT_CONVERSATIONS, (limit,))
             return cursor.fetchall()
-    
+
     def add_memory(self, conversation_id: int, fact: str, embedding: List[float]) -> int:
         """Add a memory with its embedding."""
+        # float32 arrays go over the wire in pgvector's binary format; the
+        # server converts them to halfvec on insert
+        embedding = np.asarray(embedding, dtype=np.float32)
         with self.get_cursor() as cursor:
             cursor.execute(
                 """
                 INSERT INTO memories (conversation_id, fact, embedding)
-                VALUES (%s, %s, %s)
+                VALUES (%s, %s, %s::halfvec)
                 RETURNING id
                 """,
                 (conversation_id, fact, embedding)
@@ -115,37 +128,27 @@ class ChatDatabase:
     
     def search_memories(self, query_embedding: List[float], conversation_id: Optional[int] = None, limit: int = 5) -> List[Dict]:
         """Search for similar memories using cosine similarity."""
-        with self.get_cursor() as cursor:
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        with self.get_ro_cursor() as cursor:
             if conversation_id:
                 # Search within a specific conversation
                 cursor.execute(
-                    """
-                    SELECT id, fact, conversation_id,
-                           1 - (embedding <=> %s::vector) as similarity
-                    FROM memories
-                    WHERE conversation_id = %s
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s
-                    """,
-                    (query_embedding, conversation_id, query_embedding, limit)
+                    queries.SEARCH_CONVERSATION_MEMORIES,
+                    (query_embedding, conversation_id, query_embedding, limit),
+                    prepare=True
                 )
             else:
                 # Search across all memories
                 cursor.execute(
-                    """
-                    SELECT id, fact, conversation_id,
-                           1 - (embedding <=> %s::vector) as similarity
-                    FROM memories
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s
-                    """,
-                    (query_embedding, query_embedding, limit)
+                    queries.SEARCH_MEMORIES,
+                    (query_embedding, query_embedding, limit),
+                    prepare=True
                 )
             return cursor.fetchall()
     
     def get_conversation_memories(self, conversation_id: int) -> List[Dict]:
         """Get all memories for a conversation."""
-        with self.get_cursor() as cursor:
+        with self.get_ro_cursor() as cursor:
             cursor.execute(
                 """
                 SELECT id, fact, created_at
@@ -157,29 +160,16 @@ class ChatDatabase:
             )
             return cursor.fetchall()
     
-    def get_random_memories(self, conversation_id: Optional[int] = None, limit: int = 2) -> List[Dict]:
+    def get_random_memories(self, conversation_id: Optional[int] = None, limit: int = 2, include_embeddings: bool = False) -> List[Dict]:
         """Get random memories using TABLESAMPLE for performance."""
-        with self.get_cursor() as cursor:
-            # First check if we have enough memories
-            if conversation_id:
-                cursor.execute(
-                    "SELECT COUNT(*) as count FROM memories WHERE conversation_id = %s",
-                    (conversation_id,)
-                )
-            else:
-                cursor.execute("SELECT COUNT(*) as count FROM memories")
-            
-            count = cursor.fetchone()["count"]
-            
-            if count == 0:
-                return []
-            
-            # For small tables, just use ORDER BY RANDOM()
-            # For larger tables, TABLESAMPLE would be more efficient
+        # Cast back to vector so embeddings load as float32 NumPy arrays
+        columns = "id, fact, conversation_id, embedding::vector AS embedding" if include_embeddings else "id, fact, conversation_id"
+        with self.get_ro_cursor() as cursor:
             if conversation_id:
+                # Per-conversation sets are small and served by the conversation_id index
                 cursor.execute(
-                    """
-                    SELECT id, fact, conversation_id
+                    f"""
+                    SELECT {columns}
                     FROM memories
                     WHERE conversation_id = %s
                     ORDER BY RANDOM()
@@ -189,22 +179,68 @@ class ChatDatabase:
                 )
             else:
                 cursor.execute(
-                    """
-                    SELECT id, fact, conversation_id
-                    FROM memories
-                    ORDER BY RANDOM()
-                    LIMIT %s
-                    """,
-                    (limit,)
+                    queries.RANDOM_MEMORIES_SAMPLE.format(columns=columns),
+                    (limit * 20, limit)
                 )
             
             return cursor.fetchall()
     
-    def delete_memory(self, memory_id: int) -> bool:
-        """Delete a memory by ID."""
+    def fetch_memories_bundle(self, query_embedding: List[float], semantic_limit: int = 3, random_limit: int = 2) -> Dict[str, List[Dict]]:
+        """Get semantically similar and random memories using one connection checkout."""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        with self.get_ro_cursor() as cursor:
+            cursor.execute(
+                queries.SEARCH_MEMORIES,
+                (query_embedding, query_embedding, semantic_limit),
+                prepare=True
+            )
+            semantic = cursor.fetchall()
+            
+            cursor.execute(
+                queries.RANDOM_MEMORIES_SAMPLE.format(columns="id, fact, conversation_id"),
+                (random_limit * 20, random_limit)
+            )
+            random_memories = cursor.fetchall()
+            
+            return {"semantic": semantic, "random": random_memories}
+
+    def get_cached_embeddings(self, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Look up cached embeddings by content hash, returning only the hits."""
+        with self.get_ro_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT text_sha256, embedding::vector AS embedding
+                FROM embedding_cache
+                WHERE text_sha256 = ANY(%s)
+                """,
+                (text_hashes,),
+                prepare=True
+            )
+            return {row["text_sha256"]: row["embedding"] for row in cursor.fetchall()}
+
+    def put_cached_embeddings(self, model: str, entries: List[tuple]) -> None:
+        """Store (text_hash, embedding) pairs; concurrent workers may insert the same hash."""
+        with self.get_cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO embedding_cache (text_sha256, model, embedding)
+                VALUES (%s, %s, %s::halfvec)
+                ON CONFLICT (text_sha256) DO NOTHING
+                """,
+                [(text_hash, model, np.asarray(embedding, dtype=np.float32)) for text_hash, embedding in entries]
+            )
+
+    def prune_embedding_cache(self, max_age_days: int = 30) -> int:
+        """Delete cached embeddings older than max_age_days and return how many were removed."""
         with self.get_cursor() as cursor:
             cursor.execute(
-                "DELETE FROM memories WHERE id = %s",
-                (memory_id,)
+                "DELETE FROM embedding_cache WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)",
+                (max_age_days,)
             )
+            return cursor.rowcount
+
+    def delete_memory(self, memory_id: int) -> bool:
+        """Delete a memory by ID."""
+        with self.get_cursor() as cursor:
+            cursor.execute(queries.DELETE_MEMORY, (memory_id,))
             return cursor.rowcount > 0
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""SQL shared by ChatDatabase and AsyncChatDatabase, so the two can't drift apart."""
+from typing import List, Optional, Tuple
+
+CREATE_CONVERSATION = "INSERT INTO conversations DEFAULT VALUES RETURNING id"
+
+# Insert a message and bump its conversation's updated_at in one round-trip
+ADD_MESSAGE = """
+    WITH new_message AS (
+        INSERT INTO messages (conversation_id, role, content)
+        VALUES (%s, %s, %s)
+        RETURNING id
+    ), touched AS (
+        UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = %s
+    )
+    SELECT id FROM new_message
+"""
+
+# Keyset pagination on (created_at, id), served by idx_messages_conversation_created
+_HISTORY_BEFORE = "AND (created_at, id) < (SELECT created_at, id FROM messages WHERE id = %s)"
+
+_HISTORY_RECENT = """
+    SELECT * FROM (
+        SELECT id, role, content, created_at
+        FROM messages
+        WHERE conversation_id = %s {keyset}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s OFFSET %s
+    ) AS recent_messages
+    ORDER BY created_at ASC, id ASC
+"""
+
+_HISTORY_ALL = """
+    SELECT id, role, content, created_at
+    FROM messages
+    WHERE conversation_id = %s {keyset}
+    ORDER BY created_at ASC, id ASC
+"""
+
+RECENT_CONVERSATIONS = """
+    SELECT 
+        c.id,
+        c.created_at,
+        c.updated_at,
+        COUNT(m.id) as message_count,
+        MAX(m.content) FILTER (WHERE m.role = 'user') as last_user_message
+    FROM conversations c
+    LEFT JOIN messages m ON c.id = m.conversation_id
+    GROUP BY c.id
+    ORDER BY c.updated_at DESC
+    LIMIT %s
+"""
+
+# Nearest memories by cosine distance, served by the HNSW index on embedding
+SEARCH_MEMORIES = """
+    SELECT id, fact, conversation_id,
+           1 - (embedding <=> %s::halfvec) as similarity
+    FROM memories
+    ORDER BY embedding <=> %s::halfvec
+    LIMIT %s
+"""
+
+SEARCH_CONVERSATION_MEMORIES = """
+    SELECT id, fact, conversation_id,
+           1 - (embedding <=> %s::halfvec) as similarity
+    FROM memories
+    WHERE conversation_id = %s
+    ORDER BY embedding <=> %s::halfvec
+    LIMIT %s
+"""
+
+# Sample a bounded set of rows (tsm_system_rows) instead of sorting the whole
+# table, then shuffle just the sample; format in the columns to select
+RANDOM_MEMORIES_SAMPLE = """
+    SELECT {columns}
+    FROM memories TABLESAMPLE SYSTEM_ROWS(%s)
+    ORDER BY RANDOM()
+    LIMIT %s
+"""
+
+DELETE_MEMORY = "DELETE FROM memories WHERE id = %s"
+
+
+def conversation_history_query(conversation_id: int, limit: Optional[int] = None, before_id: Optional[int] = None, exclude_last: bool = False) -> Tuple[str, List]:
+    """Build the statement and parameters for a conversation history lookup.
+
+    With limit, only the most recent messages are returned; with exclude_last,
+    the newest message (typically the one being answered) is skipped.
+    """
+    params = [conversation_id]
+    keyset = ""
+    if before_id:
+        keyset = _HISTORY_BEFORE
+        params.append(before_id)
+
+    if limit or exclude_last:
+        # LIMIT NULL means no limit
+        params.extend([limit, 1 if exclude_last else 0])
+        return _HISTORY_RECENT.format(keyset=keyset), params
+    return _HISTORY_ALL.format(keyset=keyset), params
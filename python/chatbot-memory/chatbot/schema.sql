@@ -3,6 +3,9 @@
 -- Enable pgvector extension for embeddings
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Enable tsm_system_rows for cheap random sampling of memories
+CREATE EXTENSION IF NOT EXISTS tsm_system_rows;
+
 CREATE TABLE IF NOT EXISTS conversations (
     id SERIAL PRIMARY KEY,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -22,17 +25,26 @@ CREATE TABLE IF NOT EXISTS memories (
     id SERIAL PRIMARY KEY,
     conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
     fact TEXT NOT NULL,
-    embedding vector(1536), -- OpenAI embeddings are 1536 dimensions
+    embedding halfvec(512), -- text-embedding-3-small with dimensions=512 (EMBEDDING_DIM), stored as float16
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Embeddings keyed by SHA-256 of (model, dimensions, text), shared by all workers
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    text_sha256 CHAR(64) PRIMARY KEY,
+    model TEXT NOT NULL,
+    embedding halfvec(512) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Index for faster conversation lookups
-CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at);
 
--- Index for vector similarity searches (using ivfflat for approximate search)
-CREATE INDEX IF NOT EXISTS idx_memories_embedding ON memories USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- Index for vector similarity searches (HNSW keeps recall high without retraining as memories grow)
+CREATE INDEX IF NOT EXISTS idx_memories_embedding_hnsw ON memories USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
 CREATE INDEX IF NOT EXISTS idx_memories_conversation_id ON memories(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache(created_at);
 
 -- Update trigger for conversations.updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -3,15 +3,28 @@
 -- Enable pgvector extension for embeddings
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Enable tsm_system_rows for cheap random sampling of memories
+CREATE EXTENSION IF NOT EXISTS tsm_system_rows;
+
 -- Memories table for storing facts with embeddings
 CREATE TABLE IF NOT EXISTS memories (
     id SERIAL PRIMARY KEY,
     conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
     fact TEXT NOT NULL,
-    embedding vector(1536), -- OpenAI embeddings are 1536 dimensions
+    embedding halfvec(512), -- text-embedding-3-small with dimensions=512 (EMBEDDING_DIM), stored as float16
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Embeddings keyed by SHA-256 of (model, dimensions, text), shared by all workers
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    text_sha256 CHAR(64) PRIMARY KEY,
+    model TEXT NOT NULL,
+    embedding halfvec(512) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Index for vector similarity searches (using ivfflat for approximate search)
-CREATE INDEX IF NOT EXISTS idx_memories_embedding ON memories USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-CREATE INDEX IF NOT EXISTS idx_memories_conversation_id ON memories(conversation_id);
\ No newline at end of file
+-- Index for vector similarity searches (HNSW keeps recall high without retraining as memories grow)
+DROP INDEX IF EXISTS idx_memories_embedding; -- replaced by the HNSW index below
+CREATE INDEX IF NOT EXISTS idx_memories_embedding_hnsw ON memories USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_memories_conversation_id ON memories(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache(created_at);
\ No newline at end of file
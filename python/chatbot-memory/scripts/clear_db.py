@@ -17,25 +17,9 @@ def clear_database():
     with db.get_cursor() as cursor:
         print("Clearing database...")
         
-        # Delete all memories first (due to foreign key constraints)
-        cursor.execute("DELETE FROM memories")
-        count = cursor.rowcount
-        print(f"  Deleted {count} memories")
-        
-        # Delete all messages
-        cursor.execute("DELETE FROM messages")
-        count = cursor.rowcount
-        print(f"  Deleted {count} messages")
-        
-        # Delete all conversations
-        cursor.execute("DELETE FROM conversations")
-        count = cursor.rowcount
-        print(f"  Deleted {count} conversations")
-        
-        # Reset the auto-increment sequences
-        cursor.execute("ALTER SEQUENCE conversations_id_seq RESTART WITH 1")
-        cursor.execute("ALTER SEQUENCE messages_id_seq RESTART WITH 1")
-        cursor.execute("ALTER SEQUENCE memories_id_seq RESTART WITH 1")
+        # Truncate all tables and reset their ID sequences in one statement
+        cursor.execute("TRUNCATE memories, messages, conversations RESTART IDENTITY CASCADE")
+        print("  Truncated memories, messages, and conversations")
         print("  Reset ID sequences")
         
         print("\nDatabase cleared successfully!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""One-time migration: re-embed existing memories with the current embedding model."""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+from openai import OpenAI
+from pgvector.psycopg import register_vector
+
+# Add parent directory to path to import chatbot module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot import EMBEDDING_MODEL, EMBEDDING_DIM
+
+load_dotenv()
+
+BATCH_SIZE = 100
+
+def reembed_memories():
+    """Convert memories.embedding to halfvec(EMBEDDING_DIM) and regenerate every embedding.
+    
+    Run this before setup_db.py or run_migration.py when upgrading: their halfvec
+    index can't be built while the column is still the old vector type.
+    """
+    db_url = os.environ["CHAT_DATABASE_URL"]
+    client = OpenAI()
+
+    with psycopg.connect(db_url) as conn:
+        with conn.cursor() as cursor:
+            # Indexes on the old column use vector operator classes and can't be
+            # rebuilt for halfvec, so drop them before changing the type
+            cursor.execute("DROP INDEX IF EXISTS idx_memories_embedding")
+            cursor.execute("DROP INDEX IF EXISTS idx_memories_embedding_hnsw")
+            # Old vectors can't be cast to the new type and size, so clear them
+            cursor.execute(
+                f"ALTER TABLE memories ALTER COLUMN embedding TYPE halfvec({EMBEDDING_DIM}) USING NULL"
+            )
+            conn.commit()
+            register_vector(conn)
+
+            cursor.execute("SELECT id, fact FROM memories ORDER BY id")
+            memories = cursor.fetchall()
+
+            for start in range(0, len(memories), BATCH_SIZE):
+                batch = memories[start:start + BATCH_SIZE]
+                response = client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=[fact for _, fact in batch],
+                    dimensions=EMBEDDING_DIM
+                )
+                embeddings = sorted(response.data, key=lambda item: item.index)
+                cursor.executemany(
+                    "UPDATE memories SET embedding = %s::halfvec WHERE id = %s",
+                    [
+                        (np.asarray(item.embedding, dtype=np.float32), memory_id)
+                        for (memory_id, _), item in zip(batch, embeddings)
+                    ]
+                )
+                conn.commit()
+                print(f"  Re-embedded {start + len(batch)}/{len(memories)} memories")
+
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_memories_embedding_hnsw ON memories "
+                "USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"
+            )
+            # The worker's shared embedding cache (see chatbot/schema.sql)
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    text_sha256 CHAR(64) PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    embedding halfvec({EMBEDDING_DIM}) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache(created_at)"
+            )
+            conn.commit()
+
+    print(f"✅ Memories re-embedded with {EMBEDDING_MODEL} ({EMBEDDING_DIM} dimensions)!")
+
+if __name__ == "__main__":
+    reembed_memories()
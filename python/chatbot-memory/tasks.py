@@ -1,12 +1,16 @@
+import hashlib
 import random
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 
+import numpy as np
 from hyrex import HyrexRegistry
 from dotenv import load_dotenv
-from chatbot import ChatDatabase
+from chatbot import ChatDatabase, EMBEDDING_MODEL, EMBEDDING_DIM
 from openai import OpenAI
 from pydantic import BaseModel
 
@@ -18,6 +22,46 @@ hy = HyrexRegistry()
 db = ChatDatabase()
 client = OpenAI()
 
+# Only memory pairs more similar than this are sent to GPT for consolidation
+CONSOLIDATION_SIMILARITY_THRESHOLD = 0.75
+
+# Cached embeddings older than this are pruned by prune_embedding_cache
+EMBEDDING_CACHE_MAX_AGE_DAYS = 30
+
+
+def _embedding_key(text: str) -> str:
+    """Content address for a text's embedding; changing the model or size changes the key."""
+    return hashlib.sha256(f"{EMBEDDING_MODEL}:{EMBEDDING_DIM}::{text}".encode()).hexdigest()
+
+
+def get_embeddings(texts: List[str]) -> list:
+    """Embed texts, reusing embeddings any worker has already stored in Postgres."""
+    keys = [_embedding_key(text) for text in texts]
+    embeddings = db.get_cached_embeddings(keys)
+
+    # Embed only the cache misses, in a single request
+    missing = [i for i, key in enumerate(keys) if key not in embeddings]
+    if missing:
+        embedding_response = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=[texts[i] for i in missing],
+            dimensions=EMBEDDING_DIM
+        )
+        new_entries = []
+        for i, item in zip(missing, sorted(embedding_response.data, key=lambda item: item.index)):
+            embeddings[keys[i]] = item.embedding
+            new_entries.append((keys[i], item.embedding))
+        db.put_cached_embeddings(EMBEDDING_MODEL, new_entries)
+
+    return [embeddings[key] for key in keys]
+
+
+@lru_cache(maxsize=1024)
+def _embed_cached(text: str) -> tuple:
+    """Embed text, reusing results for repeated messages in this worker process."""
+    # Tuples are immutable, so cached entries can't be mutated by callers
+    return tuple(get_embeddings([text])[0])
+
 
 @hy.task
 def test_task():
@@ -34,21 +78,6 @@ def send_n_test_tasks(n: int):
     return f"Enqueued {n} test tasks"
 
 
-# Memory retrieval tasks
-@hy.task
-def search_semantic_memories(query_embedding: list, limit: int = 3):
-    """Search for semantically similar memories."""
-    memories = db.search_memories(query_embedding, conversation_id=None, limit=limit)
-    return {"result": memories}
-
-
-@hy.task  
-def get_random_memories(limit: int = 2):
-    """Get random memories from the global memory bank."""
-    memories = db.get_random_memories(conversation_id=None, limit=limit)
-    return {"result": memories}
-
-
 # Chatbot tasks
 @hy.task
 def process_message(conversation_id: int, message: str):
@@ -56,47 +85,34 @@ def process_message(conversation_id: int, message: str):
     try:
         
         # Generate embedding for the incoming message to search memories
-        embedding_response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=message
-        )
-        query_embedding = embedding_response.data[0].embedding
-        
-        # Launch parallel memory retrieval tasks
-        semantic_task = search_semantic_memories.send(query_embedding, limit=3)
-        random_task = get_random_memories.send(limit=2)
+        query_embedding = _embed_cached(message)
         
-        # Wait for both tasks to complete
-        semantic_task.wait()
-        random_task.wait()
-        
-        # Get the actual results after waiting
-        semantic_result = semantic_task.get_result()
-        random_result = random_task.get_result()
-        
-        # Extract the actual memories from the dict wrapper
-        relevant_memories = semantic_result.get("result", []) if semantic_result else []
-        random_memories = random_result.get("result", []) if random_result else []
+        # Fetch relevant and random memories on one connection, without queueing extra tasks
+        memories = db.fetch_memories_bundle(query_embedding, semantic_limit=3, random_limit=2)
+        relevant_memories = memories["semantic"]
+        random_memories = memories["random"]
         
         # Get recent conversation history for context (limit at database level)
         # This prevents slow responses and reduces token usage
         MAX_HISTORY_MESSAGES = 10
-        recent_history = db.get_conversation_history(conversation_id, limit=MAX_HISTORY_MESSAGES)
+        # The current message was just stored, so skip it here; it's appended below
+        recent_history = db.get_conversation_history(conversation_id, limit=MAX_HISTORY_MESSAGES, exclude_last=True)
+        
+        # Drop random memories that duplicate relevant ones before building the prompt
+        relevant_facts = {mem['fact'] for mem in relevant_memories}
+        unique_random = [mem for mem in random_memories if mem['fact'] not in relevant_facts]
         
         # Build system prompt with memories
         system_content = "You are a helpful assistant. Prefer brief responses (1-3 sentences) unless the conversation benefits from more detail."
         
         # Add relevant memories if any
         if relevant_memories:
-            relevant_text = "\n".join([f"- {mem['fact']}" for mem in relevant_memories])
+            relevant_text = "\n".join(f"- {mem['fact']}" for mem in relevant_memories)
             system_content += f"\n\nRelevant memories (semantically related to current topic):\n{relevant_text}"
         
-        # Add random memories if any (excluding ones already in relevant)
-        relevant_facts = {mem['fact'] for mem in relevant_memories}
-        unique_random = [mem for mem in random_memories if mem['fact'] not in relevant_facts]
-        
+        # Add random memories if any
         if unique_random:
-            random_text = "\n".join([f"- {mem['fact']}" for mem in unique_random])
+            random_text = "\n".join(f"- {mem['fact']}" for mem in unique_random)
             system_content += f"\n\nOther memories (random selection, may offer interesting connections):\n{random_text}"
         
         if relevant_memories or unique_random:
@@ -107,12 +123,8 @@ def process_message(conversation_id: int, message: str):
             {"role": "system", "content": system_content}
         ]
         
-        # Add recent conversation history (excluding the current message we just added)
-        for msg in recent_history[:-1]:  # Skip the last message since it's the one we just added
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        # Add recent conversation history
+        messages.extend({"role": msg["role"], "content": msg["content"]} for msg in recent_history)
         
         # Add current user message
         messages.append({
@@ -205,16 +217,13 @@ Example of INCORRECT format (do not do this):
         if facts_text and facts_text != "NONE":
             facts = [f.strip() for f in facts_text.split('\n') if f.strip()]
             
-            # Generate embeddings and store each fact
-            for fact in facts[:3]:  # Limit to 3 facts per extraction
-                # Generate embedding for the fact
-                embedding_response = client.embeddings.create(
-                    model="text-embedding-ada-002",
-                    input=fact
-                )
-                embedding = embedding_response.data[0].embedding
-                
-                # Store the memory
+            facts = facts[:3]  # Limit to 3 facts per extraction
+            
+            # Generate embeddings for all uncached facts in a single request
+            embeddings = get_embeddings(facts)
+
+            # Store each fact with its embedding
+            for fact, embedding in zip(facts, embeddings):
                 db.add_memory(conversation_id, fact, embedding)
                 print(f"Stored memory: {fact[:100]}")
         
@@ -235,75 +244,105 @@ class MemoryAnalysis(BaseModel):
     consolidated_memory: Optional[str] = None
 
 
+def compare_memories(mem1: dict, mem2: dict) -> Optional[MemoryAnalysis]:
+    """Ask GPT whether two memories are duplicates or can be consolidated."""
+    try:
+        completion = client.beta.chat.completions.parse(
+            model="gpt-5",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Analyze pairs of user memories to identify duplicates or opportunities for consolidation."
+                },
+                {
+                    "role": "user",
+                    "content": f"""Analyze these two memories:
+
+Memory 1: {mem1['fact']}
+Memory 2: {mem2['fact']}
+
+Determine if they contain duplicate information or can be consolidated. If consolidating, provide a single improved memory that captures both facts."""
+                }
+            ],
+            response_format=MemoryAnalysis
+        )
+        return completion.choices[0].message.parsed
+    except Exception as e:
+        print(f"Error comparing memories: {e}")
+        return None
+
+
 @hy.task(cron="*/10 * * * *", backfill=False)  # Run every 10 minutes
 def consolidate_memories():
     """Periodically review and consolidate similar or redundant memories."""
     print("Starting memory consolidation...")
     
     # Get a small sample of memories to review
-    memories = db.get_random_memories(limit=5)
+    memories = db.get_random_memories(limit=5, include_embeddings=True)
     
     if len(memories) < 2:
         print("Not enough memories to consolidate")
         return
     
-    # Compare all pairs for potential duplicates/consolidation
-    for i in range(len(memories)):
-        for j in range(i + 1, len(memories)):
-            mem1 = memories[i]
-            mem2 = memories[j]
-            
-            try:
-                completion = client.beta.chat.completions.parse(
-                    model="gpt-5",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "Analyze pairs of user memories to identify duplicates or opportunities for consolidation."
-                        },
-                        {
-                            "role": "user",
-                            "content": f"""Analyze these two memories:
-
-Memory 1: {mem1['fact']}
-Memory 2: {mem2['fact']}
-
-Determine if they contain duplicate information or can be consolidated. If consolidating, provide a single improved memory that captures both facts."""
-                        }
-                    ],
-                    response_format=MemoryAnalysis
-                )
+    pairs = [(i, j) for i in range(len(memories)) for j in range(i + 1, len(memories))]
+    
+    # Skip obviously unrelated pairs using the stored embeddings
+    if all(mem.get('embedding') is not None for mem in memories):
+        embeddings = np.array([mem['embedding'] for mem in memories], dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        similarities = embeddings @ embeddings.T
+        pairs = [(i, j) for i, j in pairs if similarities[i, j] > CONSOLIDATION_SIMILARITY_THRESHOLD]
+        
+        if not pairs:
+            print("No similar memories to consolidate")
+            return
+    
+    # Compare the remaining pairs concurrently - each comparison is an independent API call
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        analyses = list(executor.map(lambda pair: compare_memories(memories[pair[0]], memories[pair[1]]), pairs))
+    
+    # Apply the results in order, skipping pairs whose memories were already removed
+    deleted = set()
+    for (i, j), analysis in zip(pairs, analyses):
+        if analysis is None or i in deleted or j in deleted:
+            continue
+        
+        mem1 = memories[i]
+        mem2 = memories[j]
+        
+        try:
+            if analysis.action == MemoryAction.DELETE_FIRST:
+                db.delete_memory(mem1['id'])
+                deleted.add(i)
+                print(f"Deleted redundant memory: {mem1['fact'][:50]}...")
+                
+            elif analysis.action == MemoryAction.DELETE_SECOND:
+                db.delete_memory(mem2['id'])
+                deleted.add(j)
+                print(f"Deleted redundant memory: {mem2['fact'][:50]}...")
+                
+            elif analysis.action == MemoryAction.CONSOLIDATE and analysis.consolidated_memory:
+                # Delete both old memories
+                db.delete_memory(mem1['id'])
+                db.delete_memory(mem2['id'])
+                deleted.update((i, j))
                 
-                analysis = completion.choices[0].message.parsed
+                # Create consolidated memory with embedding
+                embedding = get_embeddings([analysis.consolidated_memory])[0]
                 
-                if analysis.action == MemoryAction.DELETE_FIRST:
-                    db.delete_memory(mem1['id'])
-                    print(f"Deleted redundant memory: {mem1['fact'][:50]}...")
-                    break  # mem1 is deleted, skip remaining comparisons with it
-                    
-                elif analysis.action == MemoryAction.DELETE_SECOND:
-                    db.delete_memory(mem2['id'])
-                    print(f"Deleted redundant memory: {mem2['fact'][:50]}...")
-                    
-                elif analysis.action == MemoryAction.CONSOLIDATE and analysis.consolidated_memory:
-                    # Delete both old memories
-                    db.delete_memory(mem1['id'])
-                    db.delete_memory(mem2['id'])
-                    
-                    # Create consolidated memory with embedding
-                    embedding_response = client.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=analysis.consolidated_memory
-                    )
-                    embedding = embedding_response.data[0].embedding
-                    
-                    # Use conversation_id from first memory
-                    db.add_memory(mem1.get('conversation_id', 1), analysis.consolidated_memory, embedding)
-                    print(f"Consolidated into: {analysis.consolidated_memory[:50]}...")
-                    break  # Both memories handled, skip remaining comparisons
-                    
-            except Exception as e:
-                print(f"Error comparing memories: {e}")
-                continue
+                # Use conversation_id from first memory
+                db.add_memory(mem1.get('conversation_id', 1), analysis.consolidated_memory, embedding)
+                print(f"Consolidated into: {analysis.consolidated_memory[:50]}...")
+                
+        except Exception as e:
+            print(f"Error applying memory analysis: {e}")
+            continue
     
     print("Memory consolidation complete")
+
+
+@hy.task(cron="0 3 * * *", backfill=False)  # Run daily at 03:00
+def prune_embedding_cache():
+    """Drop old entries from the shared embedding cache."""
+    removed = db.prune_embedding_cache(max_age_days=EMBEDDING_CACHE_MAX_AGE_DAYS)
+    print(f"Pruned {removed} cached embeddings")
@@ -3,17 +3,20 @@ FastAPI backend for deep research system.
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import os
 import uuid
+import asyncio
 from pathlib import Path
 from datetime import datetime
+from cachetools import TTLCache
 
 from tasks import research_question, get_research_status, store_research_result, hy
 
-app = FastAPI(title="Deep Research System")
+# orjson serializes the large nested research results much faster than stdlib json
+app = FastAPI(title="Deep Research System", default_response_class=ORJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -58,8 +61,17 @@ async def read_root():
         """)
 
 
-# Store active tasks (in production, use a database)
-active_tasks = {}
+# Store active tasks (in production, use a database). Bounded by size and age so
+# tasks that are never polled to completion don't accumulate forever.
+active_tasks = TTLCache(maxsize=10_000, ttl=3600)
+
+# Upper bound on the interval between server-side status refreshes while streaming,
+# and how long a stream waits before giving up (matches the active_tasks TTL)
+STATUS_WATCH_MAX_DELAY = 5.0
+STATUS_WATCH_TIMEOUT = 3600
+
+# Send an SSE comment this often so proxies don't close idle event streams
+STATUS_KEEPALIVE_INTERVAL = 15
 
 @app.post("/api/research", response_model=ResearchResponse)
 async def start_research(request: ResearchRequest):
@@ -79,7 +91,7 @@ async def start_research(request: ResearchRequest):
     # Send research task to Hyrex
     try:
         # Launch the workflow
-        task = research_question.send(request.question, request.depth)
+        task = await asyncio.to_thread(research_question.send, request.question, request.depth)
         
         # Store the task for later status checking
         active_tasks[task_id] = {
@@ -99,21 +111,11 @@ async def start_research(request: ResearchRequest):
         raise HTTPException(status_code=500, detail=f"Failed to start research: {str(e)}")
 
 
-@app.get("/api/research/{task_id}", response_model=ResearchStatus)
-async def get_research_status_endpoint(task_id: str):
-    """
-    Check the status of a research task.
-    """
-    # Check if we have this task
-    if task_id not in active_tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    task_info = active_tasks[task_id]
-    hyrex_task = task_info["task"]
-    
+async def _check_research_status(task_id: str, hyrex_task) -> ResearchStatus:
+    """Refresh a research task from Hyrex and report its current status."""
     try:
         # Check if task is complete
-        hyrex_task.refresh()
+        await asyncio.to_thread(hyrex_task.refresh)
         
         # Get the latest task run to check status
         if hyrex_task.task_runs:
@@ -121,10 +123,10 @@ async def get_research_status_endpoint(task_id: str):
             
             if latest_run.status == "SUCCESS":
                 # Get the result
-                result = hyrex_task.get_result()
+                result = await asyncio.to_thread(hyrex_task.get_result)
                 
-                # Clean up from active tasks
-                del active_tasks[task_id]
+                # Clean up from active tasks (a concurrent poll may have already)
+                active_tasks.pop(task_id, None)
                 
                 return ResearchStatus(
                     task_id=task_id,
@@ -133,7 +135,7 @@ async def get_research_status_endpoint(task_id: str):
                 )
             elif latest_run.status == "FAILED":
                 # Task failed
-                del active_tasks[task_id]
+                active_tasks.pop(task_id, None)
                 
                 return ResearchStatus(
                     task_id=task_id,
@@ -164,6 +166,66 @@ async def get_research_status_endpoint(task_id: str):
         )
 
 
+# One watcher per task, shared by every client streaming that task's status
+status_watchers: Dict[str, asyncio.Task] = {}
+
+async def _watch_research_task(task_id: str, hyrex_task) -> ResearchStatus:
+    """Refresh a task with backoff until it finishes or the watch times out."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STATUS_WATCH_TIMEOUT
+    delay = 1.0
+    try:
+        while True:
+            status = await _check_research_status(task_id, hyrex_task)
+            if status.status != "processing" or loop.time() >= deadline:
+                return status
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, STATUS_WATCH_MAX_DELAY)
+    finally:
+        status_watchers.pop(task_id, None)
+
+
+@app.get("/api/research/{task_id}", response_model=ResearchStatus)
+async def get_research_status_endpoint(task_id: str):
+    """
+    Check the status of a research task.
+    """
+    # Check if we have this task
+    if task_id not in active_tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    return await _check_research_status(task_id, active_tasks[task_id]["task"])
+
+
+@app.get("/api/research/{task_id}/events")
+async def stream_research_status(task_id: str):
+    """
+    Stream a research task's final status as a single server-sent event.
+    
+    Clients wait on one shared server-side watcher instead of each polling Hyrex.
+    """
+    if task_id not in active_tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    watcher = status_watchers.get(task_id)
+    if watcher is None:
+        watcher = asyncio.create_task(_watch_research_task(task_id, active_tasks[task_id]["task"]))
+        status_watchers[task_id] = watcher
+    
+    async def events():
+        while True:
+            try:
+                # Shield the shared watcher so one client disconnecting (or a
+                # keepalive timeout) doesn't cancel it for others
+                status = await asyncio.wait_for(asyncio.shield(watcher), STATUS_KEEPALIVE_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+        yield f"data: {status.model_dump_json()}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
@@ -179,10 +241,10 @@ async def test_research():
     test_question = "What are the latest developments in renewable energy?"
     
     try:
-        # Run the research workflow using Hyrex
-        task = research_question.send(test_question, "quick")
-        task.wait(timeout=60)  # Wait up to 60 seconds
-        result = task.get_result()
+        # Run the research workflow using Hyrex; blocking calls run off the event loop
+        task = await asyncio.to_thread(research_question.send, test_question, "quick")
+        await asyncio.to_thread(task.wait, timeout=60)  # Wait up to 60 seconds
+        result = await asyncio.to_thread(task.get_result)
         
         return {
             "status": "success",
@@ -2,21 +2,34 @@
 Search provider implementations using free APIs.
 """
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from duckduckgo_search import DDGS
 import wikipediaapi
 import arxiv
 import logging
+import re
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Queries mentioning any of these (or their plurals) also search arXiv
+ACADEMIC_KEYWORDS_RE = re.compile(
+    r"\b(?:research|study|algorithm|model|theory|analysis|science|technology|engineering|"
+    r"mathematics|physics|computer|AI|machine learning|neural|quantum)s?\b",
+    re.IGNORECASE
+)
+
 
 class DuckDuckGoSearch:
     """Free web search using DuckDuckGo."""
     
     def __init__(self):
         self.ddgs = DDGS()
+        # Web and news searches run concurrently, so news gets its own client and
+        # a failure in one can't poison the other mid-request
+        self.news_ddgs = DDGS()
     
     def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -31,13 +44,12 @@ class DuckDuckGoSearch:
         """
         import time
         
-        # Try with increasing delays if rate-limited
-        for delay in [2, 5, 10]:
-            time.sleep(delay)
+        # First attempt runs immediately; back off only after a rate limit
+        for delay in [0, 2, 5, 10]:
+            if delay:
+                time.sleep(delay)
             
             try:
-                # Reinitialize DDGS for each attempt
-                self.ddgs = DDGS()
                 results = list(self.ddgs.text(query, max_results=max_results))
                 formatted_results = []
                 
@@ -53,9 +65,12 @@ class DuckDuckGoSearch:
                 return formatted_results
                 
             except Exception as e:
+                # DDGS refuses every later request once a call has failed, so
+                # replace it before retrying (and for the next search)
+                self.ddgs = DDGS()
                 error_str = str(e)
                 if "202" in error_str or "Ratelimit" in error_str:
-                    logger.warning(f"DuckDuckGo rate limit, retrying with {delay}s delay: {e}")
+                    logger.warning(f"DuckDuckGo rate limit, retrying: {e}")
                     continue
                 else:
                     logger.error(f"DuckDuckGo search error: {e}")
@@ -68,26 +83,41 @@ class DuckDuckGoSearch:
     def search_news(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """Search for news articles using DuckDuckGo."""
         import time
-        time.sleep(1)  # Add delay to avoid rate limiting
         
-        try:
-            results = list(self.ddgs.news(query, max_results=max_results))
-            formatted_results = []
-            
-            for result in results:
-                formatted_results.append({
-                    "title": result.get("title", ""),
-                    "snippet": result.get("body", ""),
-                    "url": result.get("url", ""),
-                    "date": result.get("date", ""),
-                    "source": "duckduckgo_news"
-                })
-            
-            return formatted_results
+        # First attempt runs immediately; back off only after a rate limit
+        for delay in [0, 2, 5]:
+            if delay:
+                time.sleep(delay)
             
-        except Exception as e:
-            logger.error(f"DuckDuckGo news search error: {e}")
-            return []
+            try:
+                results = list(self.news_ddgs.news(query, max_results=max_results))
+                formatted_results = []
+                
+                for result in results:
+                    formatted_results.append({
+                        "title": result.get("title", ""),
+                        "snippet": result.get("body", ""),
+                        "url": result.get("url", ""),
+                        "date": result.get("date", ""),
+                        "source": "duckduckgo_news"
+                    })
+                
+                return formatted_results
+                
+            except Exception as e:
+                # Replace the failed client; DDGS refuses every later request otherwise
+                self.news_ddgs = DDGS()
+                error_str = str(e)
+                if "202" in error_str or "Ratelimit" in error_str:
+                    logger.warning(f"DuckDuckGo news rate limit, retrying: {e}")
+                    continue
+                else:
+                    logger.error(f"DuckDuckGo news search error: {e}")
+                    return []
+        
+        # All retries failed
+        logger.error(f"DuckDuckGo news search failed after retries for: {query}")
+        return []
 
 
 class WikipediaSearch:
@@ -125,18 +155,12 @@ class WikipediaSearch:
                     "source": "wikipedia"
                 })
                 
-                # Get related pages from links
+                # Get related pages from links, fetching them concurrently
                 links = list(page.links.keys())[:max_results-1]
-                for link_title in links:
-                    link_page = self.wiki.page(link_title)
-                    if link_page.exists():
-                        link_summary = link_page.summary[:300] if len(link_page.summary) > 300 else link_page.summary
-                        results.append({
-                            "title": link_page.title,
-                            "snippet": link_summary + "...",
-                            "url": link_page.fullurl,
-                            "source": "wikipedia"
-                        })
+                if links:
+                    with ThreadPoolExecutor(max_workers=len(links)) as executor:
+                        link_results = executor.map(self._fetch_link_summary, links)
+                    results.extend(r for r in link_results if r)
             
             logger.info(f"Wikipedia search for '{query}' returned {len(results)} results")
             return results[:max_results]
@@ -145,6 +169,19 @@ class WikipediaSearch:
             logger.error(f"Wikipedia search error: {e}")
             return []
     
+    def _fetch_link_summary(self, title: str) -> Optional[Dict[str, Any]]:
+        """Fetch a linked article's summary; pages load lazily, so this does the HTTP work."""
+        link_page = self.wiki.page(title)
+        if not link_page.exists():
+            return None
+        link_summary = link_page.summary[:300] if len(link_page.summary) > 300 else link_page.summary
+        return {
+            "title": link_page.title,
+            "snippet": link_summary + "...",
+            "url": link_page.fullurl,
+            "source": "wikipedia"
+        }
+    
     def get_full_content(self, title: str) -> Optional[str]:
         """Get full content of a Wikipedia article."""
         try:
@@ -160,6 +197,14 @@ class WikipediaSearch:
 class ArxivSearch:
     """Free academic paper search using arXiv."""
     
+    def __init__(self):
+        # One client keeps its HTTP session (and warm connections) across searches.
+        # Every caller asks for 3 results, so one page of 3 is all that's downloaded.
+        # The client's default 3s delay between requests also applies across
+        # searches in this process, which is intended: it keeps us within arXiv's
+        # rate limit.
+        self.client = arxiv.Client(page_size=3, num_retries=2)
+    
     def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """
         Search arXiv for academic papers.
@@ -179,7 +224,7 @@ class ArxivSearch:
             )
             
             results = []
-            for paper in search.results():
+            for paper in islice(self.client.results(search), max_results):
                 results.append({
                     "title": paper.title,
                     "snippet": paper.summary[:500] + "..." if len(paper.summary) > 500 else paper.summary,
@@ -216,22 +261,23 @@ class SearchAggregator:
         Returns:
             Dictionary with results from each provider
         """
-        results = {
-            "web": self.duckduckgo.search(query, max_results=5),
-            "news": self.duckduckgo.search_news(query, max_results=3),
-            "wikipedia": self.wikipedia.search(query, max_results=2)
-        }
-        
-        if include_academic:
+        # Providers are independent and network-bound, so query them concurrently.
+        # Each provider catches its own errors and returns [] on failure.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                "web": executor.submit(self.duckduckgo.search, query, max_results=5),
+                "news": executor.submit(self.duckduckgo.search_news, query, max_results=3),
+                "wikipedia": executor.submit(self.wikipedia.search, query, max_results=2)
+            }
+            
             # Only search arXiv if the query seems academic/technical
-            academic_keywords = ["research", "study", "algorithm", "model", "theory", "analysis", 
-                               "science", "technology", "engineering", "mathematics", "physics",
-                               "computer", "AI", "machine learning", "neural", "quantum"]
+            if include_academic and ACADEMIC_KEYWORDS_RE.search(query):
+                futures["academic"] = executor.submit(self.arxiv.search, query, max_results=3)
             
-            if any(keyword.lower() in query.lower() for keyword in academic_keywords):
-                results["academic"] = self.arxiv.search(query, max_results=3)
-            else:
-                results["academic"] = []
+            results = {name: future.result() for name, future in futures.items()}
+        
+        if include_academic:
+            results.setdefault("academic", [])
         
         total_results = sum(len(r) for r in results.values())
         logger.info(f"Aggregated search for '{query}' returned {total_results} total results")
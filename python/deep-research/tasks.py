@@ -2,15 +2,26 @@
 Hyrex task definitions for deep research system.
 """
 import os
-import json
 import time
-from typing import List, Dict, Any, Optional
+import atexit
+import queue
+import hashlib
+import heapq
+import sqlite3
+import threading
+import re
+from collections import Counter
+from typing import List, Dict, Any, Optional, Type
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
+import orjson
+import tiktoken
 
 from hyrex import HyrexRegistry
 from search_providers import SearchAggregator, DuckDuckGoSearch, WikipediaSearch, ArxivSearch
 from openai import OpenAI
+from pydantic import BaseModel
 
 load_dotenv()
 
@@ -27,6 +38,204 @@ if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY environment variable is required. Please set it in your .env file.")
 client = OpenAI()
 
+# Candidate theme words: runs of 5+ letters, so punctuation never needs stripping
+THEME_WORD_RE = re.compile(r"[a-z]{5,}")
+
+# Common words to ignore when extracting themes
+# THEME_WORD_RE only yields words of 5+ letters, so shorter stop words never need filtering
+THEME_STOP_WORDS = frozenset({"would", "could", "should"})
+
+# Bounds on the search results sent to the analysis prompt; o200k_base is the
+# tokenizer used by the gpt-4o and gpt-5 model families
+PROMPT_MAX_SOURCES = 15
+PROMPT_TOKEN_BUDGET = 1500
+PROMPT_ENCODING = "o200k_base"
+
+# Research prompts produce short outputs (question and insight lists, a 2-3 sentence
+# summary), so a smaller, faster model suffices
+RESEARCH_MODEL = "gpt-5-mini"
+
+
+# System prompts are fixed strings and all per-request content goes in the final user
+# message, so every call to a task shares a byte-identical prefix the provider can cache
+SYSTEM_DECOMPOSITION = (
+    "You are a research assistant that breaks down complex questions into specific "
+    "sub-questions for thorough investigation. Each sub-question should help answer "
+    "the original question comprehensively."
+)
+SYSTEM_ANALYSIS = (
+    "You are a research analyst. Extract key insights from search results. "
+    "Given a list of search results, provide 3-5 key insights."
+)
+SYSTEM_SYNTHESIS = (
+    "You are a research report writer. Create concise executive summaries. "
+    "Given a research question with its key themes and insights, write a 2-3 sentence executive summary."
+)
+
+
+class Decomposition(BaseModel):
+    sub_questions: List[str]
+
+
+class Insights(BaseModel):
+    insights: List[str]
+
+
+# Research results, search results and LLM completions are stored in SQLite (WAL mode)
+# so every worker process on this host sees them. WAL needs shared memory between
+# processes, so RESEARCH_CACHE_PATH must be on a local disk, not a network filesystem;
+# workers on other hosts keep their own cache
+RESEARCH_CACHE_PATH = os.getenv("RESEARCH_CACHE_PATH", "research_cache.db")
+RESEARCH_CACHE_TTL = 86400  # seconds
+SEARCH_CACHE_TTL = 1800  # seconds
+LLM_CACHE_TTL = 3600  # seconds
+
+
+def _research_cache_connection() -> sqlite3.Connection:
+    """Open a connection to the shared research cache."""
+    return sqlite3.connect(RESEARCH_CACHE_PATH, timeout=5)
+
+
+def _init_research_cache() -> None:
+    """Create the cache tables and enable WAL for concurrent readers."""
+    conn = _research_cache_connection()
+    try:
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_cache ("
+                "task_id TEXT PRIMARY KEY, result BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "search_key TEXT PRIMARY KEY, results BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "prompt_key TEXT PRIMARY KEY, content BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+    finally:
+        conn.close()
+
+
+_init_research_cache()
+
+# Cache writes are applied by a background thread so tasks return without waiting
+# on SQLite; a write still queued when a worker is killed is lost, which is fine
+# for a cache. Pending writes are flushed on normal interpreter exit.
+_cache_write_queue = queue.Queue()
+
+
+def _cache_writer() -> None:
+    """Apply queued cache writes, each group of statements in one transaction."""
+    conn = _research_cache_connection()
+    while True:
+        statements = _cache_write_queue.get()
+        try:
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"Error writing research cache: {e}")
+        finally:
+            _cache_write_queue.task_done()
+
+
+def _queue_cache_write(*statements: tuple) -> None:
+    """Queue (sql, params) statements to be written together in the background."""
+    _cache_write_queue.put(statements)
+
+
+threading.Thread(target=_cache_writer, name="research-cache-writer", daemon=True).start()
+atexit.register(_cache_write_queue.join)
+
+
+def _search_cache_key(query: str, search_type: str, include_academic: bool) -> str:
+    """Hash a normalized search so rewordings that differ only in case or spacing share an entry."""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha256(f"{normalized}|{search_type}|{include_academic}".encode()).hexdigest()
+
+
+def _get_cached_search(search_key: str) -> Optional[List[Dict[str, Any]]]:
+    """Return cached search results, or None if missing or expired."""
+    conn = _research_cache_connection()
+    try:
+        row = conn.execute(
+            "SELECT results FROM search_cache WHERE search_key = ? AND stored_at > ?",
+            (search_key, time.time() - SEARCH_CACHE_TTL)
+        ).fetchone()
+    finally:
+        conn.close()
+    return orjson.loads(row[0]) if row else None
+
+
+def _store_cached_search(search_key: str, results: List[Dict[str, Any]]) -> None:
+    """Queue search results for caching, pruning expired entries."""
+    now = time.time()
+    _queue_cache_write(
+        (
+            "INSERT OR REPLACE INTO search_cache (search_key, results, stored_at) VALUES (?, ?, ?)",
+            (search_key, orjson.dumps(results), now)
+        ),
+        ("DELETE FROM search_cache WHERE stored_at <= ?", (now - SEARCH_CACHE_TTL,))
+    )
+
+
+def cached_completion(model: str, messages: List[Dict[str, str]], response_format: Optional[Type[BaseModel]] = None) -> Any:
+    """
+    Return the completion for a chat prompt, reusing recent identical requests.
+    
+    With a response_format model the parsed structured output is returned
+    (None if the model refused); otherwise the completion text.
+    """
+    # Canonicalize surrounding whitespace so trivially different prompts share an entry
+    messages = [{"role": m["role"], "content": m["content"].strip()} for m in messages]
+    key = hashlib.sha256(
+        orjson.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "response_format": response_format.__name__ if response_format else None
+            },
+            option=orjson.OPT_SORT_KEYS
+        )
+    ).hexdigest()
+    
+    conn = _research_cache_connection()
+    try:
+        row = conn.execute(
+            "SELECT content FROM llm_cache WHERE prompt_key = ? AND stored_at > ?",
+            (key, time.time() - LLM_CACHE_TTL)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row:
+        content = orjson.loads(row[0])
+        return response_format.model_validate(content) if response_format else content
+    
+    if response_format is None:
+        response = client.chat.completions.create(model=model, messages=messages)
+        content = response.choices[0].message.content
+    else:
+        response = client.beta.chat.completions.parse(
+            model=model,
+            messages=messages,
+            response_format=response_format
+        )
+        content = response.choices[0].message.parsed
+    
+    # Refusals and empty completions are not cached, so the next request retries
+    if content is not None:
+        now = time.time()
+        _queue_cache_write(
+            (
+                "INSERT OR REPLACE INTO llm_cache (prompt_key, content, stored_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(content.model_dump() if response_format else content), now)
+            ),
+            ("DELETE FROM llm_cache WHERE stored_at <= ?", (now - LLM_CACHE_TTL,))
+        )
+    return content
+
 
 @hy.task
 def decompose_question(question: str, depth: str = "standard") -> Dict[str, Any]:
@@ -43,20 +252,18 @@ def decompose_question(question: str, depth: str = "standard") -> Dict[str, Any]
     }.get(depth, 4)
     
     # Use GPT to decompose the question
-    response = client.chat.completions.create(
-        model="gpt-5",
+    decomposition = cached_completion(
+        model=RESEARCH_MODEL,
         messages=[
-            {"role": "system", "content": "You are a research assistant that breaks down complex questions into specific sub-questions for thorough investigation."},
-            {"role": "user", "content": f"""Break down this question into {num_subquestions} specific sub-questions that would help answer it comprehensively:
-                
-Question: {question}
+            {"role": "system", "content": SYSTEM_DECOMPOSITION},
+            {"role": "user", "content": f"""Question: {question}
 
-Provide exactly {num_subquestions} sub-questions, one per line, without numbering."""}
-        ]
+Provide exactly {num_subquestions} sub-questions."""}
+        ],
+        response_format=Decomposition
     )
     
-    sub_questions = response.choices[0].message.content.strip().split('\n')
-    sub_questions = [q.strip() for q in sub_questions if q.strip()][:num_subquestions]
+    sub_questions = [q.strip() for q in decomposition.sub_questions if q.strip()][:num_subquestions] if decomposition else []
     
     return {
         "original_question": question,
@@ -79,25 +286,45 @@ def generate_mock_subquestions(question: str, num: int) -> List[str]:
     return base_questions[:num]
 
 
+# Provider call and result count for each search type
+SEARCH_PROVIDERS = {
+    "general": (duckduckgo.search, 5),
+    "news": (duckduckgo.search_news, 5),
+    "wikipedia": (wikipedia.search, 3),
+    "academic": (arxiv.search, 3),
+}
+
+
+def _run_search(query: str, search_type: str, include_academic: bool) -> List[Dict[str, Any]]:
+    """Query the provider(s) for a search type."""
+    if search_type == "all":
+        # SearchAggregator queries the providers concurrently; each returns [] on failure
+        by_provider = search_aggregator.search_all(query, include_academic=include_academic)
+        return [result for results in by_provider.values() for result in results]
+    
+    search_fn, max_results = SEARCH_PROVIDERS.get(search_type, SEARCH_PROVIDERS["general"])
+    return search_fn(query, max_results=max_results)
+
+
 @hy.task
-def search_web(query: str, search_type: str = "general") -> Dict[str, Any]:
+def search_web(query: str, search_type: str = "general", include_academic: bool = False) -> Dict[str, Any]:
     """
     Perform web search using specified search type.
+    
+    search_type "all" queries general, news and Wikipedia (plus arXiv when
+    include_academic is set and the query looks academic) concurrently via
+    SearchAggregator within this one task. Results are
+    cached across workers for SEARCH_CACHE_TTL seconds.
     """
     print(f"🔍 Searching {search_type}: {query}")
     
-    results = []
-    
-    if search_type == "general":
-        results = duckduckgo.search(query, max_results=5)
-    elif search_type == "news":
-        results = duckduckgo.search_news(query, max_results=5)
-    elif search_type == "wikipedia":
-        results = wikipedia.search(query, max_results=3)
-    elif search_type == "academic":
-        results = arxiv.search(query, max_results=3)
-    else:
-        results = duckduckgo.search(query, max_results=5)
+    search_key = _search_cache_key(query, search_type, include_academic)
+    results = _get_cached_search(search_key)
+    if results is None:
+        results = _run_search(query, search_type, include_academic)
+        # Providers return [] on errors and rate limits, so only cache real hits
+        if results:
+            _store_cached_search(search_key, results)
     
     return {
         "query": query,
@@ -115,17 +342,39 @@ def analyze_results(search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     print(f"🔬 Analyzing {len(search_results)} search result sets")
     
-    # Aggregate all results
+    # Aggregate all results in a single pass, collecting the theme text, the
+    # longest snippets and the prompt candidates along the way
     all_results = []
+    seen_results = set()
+    theme_text_parts = []
+    longest = []  # min-heap of (snippet length, -index, result), bounded to 10
+    prompt_candidates = []
     for result_set in search_results:
-        if "results" in result_set:
-            all_results.extend(result_set["results"])
+        for r in result_set.get("results", []):
+            # Providers and overlapping queries often return the same page; count it once
+            result_key = fingerprint(r.get("url") or r.get("title", ""))
+            if result_key in seen_results:
+                continue
+            seen_results.add(result_key)
+            
+            i = len(all_results)
+            all_results.append(r)
+            title, snippet = r.get("title", ""), r.get("snippet", "")
+            theme_text_parts.append(title)
+            theme_text_parts.append(snippet)
+            # -index makes earlier results win ties, matching a stable sort
+            entry = (len(snippet), -i, r)
+            if len(longest) < 10:
+                heapq.heappush(longest, entry)
+            else:
+                heapq.heappushpop(longest, entry)
+            prompt_candidates.append((-len(snippet), i, title, snippet))
     
     # Extract key themes (simplified without LLM)
-    themes = extract_themes(all_results)
+    themes = extract_themes_from_text(" ".join(theme_text_parts))
     
     # Find most relevant sources
-    top_sources = sorted(all_results, key=lambda x: len(x.get("snippet", "")), reverse=True)[:10]
+    top_sources = [r for _, _, r in sorted(longest, reverse=True)]
     
     analysis = {
         "total_results": len(all_results),
@@ -137,49 +386,73 @@ def analyze_results(search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
     
     if all_results:
         # Use GPT to generate insights
-        combined_text = "\n".join([f"- {r.get('title', '')}: {r.get('snippet', '')[:200]}" for r in all_results[:15]])
+        combined_text = "\n".join(build_prompt_lines(prompt_candidates))
         
-        response = client.chat.completions.create(
-            model="gpt-5",
+        insights = cached_completion(
+            model=RESEARCH_MODEL,
             messages=[
-                {"role": "system", "content": "You are a research analyst. Extract key insights from search results."},
-                {"role": "user", "content": f"""Analyze these search results and provide 3-5 key insights:
-
-{combined_text}
+                {"role": "system", "content": SYSTEM_ANALYSIS},
+                {"role": "user", "content": f"""Search results:
 
-Provide insights as bullet points."""}
-            ]
+{combined_text}"""}
+            ],
+            response_format=Insights
         )
         
-        insights = response.choices[0].message.content.strip().split('\n')
-        analysis["key_insights"] = [i.strip().lstrip('- •') for i in insights if i.strip()]
+        analysis["key_insights"] = [i.strip() for i in insights.insights if i.strip()] if insights else []
     else:
         analysis["key_insights"] = []
     
     return analysis
 
 
-def extract_themes(results: List[Dict[str, Any]]) -> List[str]:
-    """Extract common themes from search results."""
-    # Simple keyword extraction
-    text = " ".join([r.get("title", "") + " " + r.get("snippet", "") for r in results])
-    words = text.lower().split()
-    
-    # Common words to ignore
-    stop_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", 
-                  "of", "with", "by", "from", "is", "are", "was", "were", "been", "be",
-                  "have", "has", "had", "do", "does", "did", "will", "would", "could", "should"}
+def fingerprint(text: str) -> bytes:
+    """Short, fast hash used to spot duplicate results."""
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+@lru_cache(maxsize=None)
+def _prompt_encoding() -> tiktoken.Encoding:
+    """Load the prompt tokenizer on first use; tiktoken may download it on a cold cache."""
+    return tiktoken.get_encoding(PROMPT_ENCODING)
+
+
+def build_prompt_lines(candidates: List[tuple]) -> List[str]:
+    """
+    Pick the prompt lines for analysis from (-snippet length, index, title, snippet) tuples.
     
-    # Count word frequency
-    word_freq = {}
-    for word in words:
-        word = word.strip('.,!?";')
-        if len(word) > 4 and word not in stop_words:
-            word_freq[word] = word_freq.get(word, 0) + 1
+    Longest snippets come first, each title is used once, and selection stops at
+    PROMPT_MAX_SOURCES lines or PROMPT_TOKEN_BUDGET tokens, since LLM latency
+    grows with prompt size.
+    """
+    # Pop from a heap rather than sorting, as only the first few candidates are used
+    heapq.heapify(candidates)
+    lines = []
+    seen_titles = set()
+    tokens = 0
+    while candidates and len(lines) < PROMPT_MAX_SOURCES:
+        _, _, title, snippet = heapq.heappop(candidates)
+        title_key = fingerprint(title.lower())
+        if title_key in seen_titles:
+            continue
+        seen_titles.add(title_key)
+        
+        line = f"- {title}: {snippet[:200]}"
+        line_tokens = len(_prompt_encoding().encode(line))
+        if tokens + line_tokens > PROMPT_TOKEN_BUDGET:
+            break
+        lines.append(line)
+        tokens += line_tokens
+    return lines
+
+
+def extract_themes_from_text(text: str) -> List[str]:
+    """Extract common themes from already-joined result text."""
+    # Count word frequency; the regex tokenizes in C and only yields words longer than 4 letters
+    word_freq = Counter(word for word in THEME_WORD_RE.findall(text.lower()) if word not in THEME_STOP_WORDS)
     
     # Get top themes
-    themes = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:5]
-    return [theme[0] for theme in themes]
+    return [word for word, _ in word_freq.most_common(5)]
 
 
 @hy.task
@@ -205,21 +478,17 @@ def synthesize_findings(decomposition: Dict[str, Any], analysis: Dict[str, Any])
     themes_text = ", ".join(analysis["key_themes"])
     
     if insights_text and themes_text:
-        response = client.chat.completions.create(
-            model="gpt-5",
+        response_text = cached_completion(
+            model=RESEARCH_MODEL,
             messages=[
-                {"role": "system", "content": "You are a research report writer. Create concise executive summaries."},
-                {"role": "user", "content": f"""Create a brief executive summary for this research:
-
-Question: {decomposition['original_question']}
+                {"role": "system", "content": SYSTEM_SYNTHESIS},
+                {"role": "user", "content": f"""Question: {decomposition['original_question']}
 Key Themes: {themes_text}
-Key Insights: {insights_text}
-
-Write a 2-3 sentence executive summary."""}
+Key Insights: {insights_text}"""}
             ]
         )
         
-        report["executive_summary"] = response.choices[0].message.content.strip()
+        report["executive_summary"] = response_text.strip()
     else:
         report["executive_summary"] = "No search results were found for this query."
     
@@ -236,15 +505,9 @@ def research_question(question: str, depth: str = "standard") -> Dict[str, Any]:
     # Step 1: Launch ALL tasks in parallel first
     decomposition_task = decompose_question.send(question, depth)
     
-    # Launch initial searches on the main question (parallel with decomposition)
-    initial_search_tasks = []
-    initial_search_tasks.append(search_web.send(question, "general"))
-    initial_search_tasks.append(search_web.send(question, "news"))
-    initial_search_tasks.append(search_web.send(question, "wikipedia"))
-    
-    # Add academic search if depth is deep
-    if depth == "deep":
-        initial_search_tasks.append(search_web.send(question, "academic"))
+    # Launch initial searches on the main question (parallel with decomposition);
+    # one task queries every provider, adding arXiv if depth is deep
+    initial_search_tasks = [search_web.send(question, "all", depth == "deep")]
     
     # Step 2: Wait for decomposition and get sub-questions
     decomposition_task.wait()
@@ -272,8 +535,9 @@ def research_question(question: str, depth: str = "standard") -> Dict[str, Any]:
     analysis_task.wait()
     analysis = analysis_task.get_result()
     
-    # Step 6: Synthesize findings
-    synthesis_task = synthesize_findings.send(decomposition, analysis)
+    # Step 6: Synthesize findings; the report keeps only the top 5 sources, so
+    # don't serialize the rest through the task queue
+    synthesis_task = synthesize_findings.send(decomposition, {**analysis, "top_sources": analysis["top_sources"][:5]})
     synthesis_task.wait()
     final_report = synthesis_task.get_result()
     
@@ -282,10 +546,6 @@ def research_question(question: str, depth: str = "standard") -> Dict[str, Any]:
     return final_report
 
 
-# Storage for research results (in production, use a database)
-research_cache = {}
-
-
 @hy.task
 def get_research_status(task_id: str) -> Dict[str, Any]:
     """
@@ -293,11 +553,20 @@ def get_research_status(task_id: str) -> Dict[str, Any]:
     """
     # In a real implementation, this would check Hyrex task status
     # For now, return from cache if available
-    if task_id in research_cache:
+    conn = _research_cache_connection()
+    try:
+        row = conn.execute(
+            "SELECT result FROM research_cache WHERE task_id = ? AND stored_at > ?",
+            (task_id, time.time() - RESEARCH_CACHE_TTL)
+        ).fetchone()
+    finally:
+        conn.close()
+    
+    if row:
         return {
             "task_id": task_id,
             "status": "completed",
-            "result": research_cache[task_id]
+            "result": orjson.loads(row[0])
         }
     else:
         return {
@@ -312,11 +581,19 @@ def store_research_result(task_id: str, result: Dict[str, Any]) -> None:
     """
     Store research result in cache.
     """
-    research_cache[task_id] = result
-    print(f"📁 Stored research result for task {task_id}")
+    now = time.time()
+    _queue_cache_write(
+        (
+            "INSERT OR REPLACE INTO research_cache (task_id, result, stored_at) VALUES (?, ?, ?)",
+            (task_id, orjson.dumps(result), now)
+        ),
+        # Expire old results as new ones arrive
+        ("DELETE FROM research_cache WHERE stored_at <= ?", (now - RESEARCH_CACHE_TTL,))
+    )
+    print(f"📁 Queued research result for task {task_id}")
 
 
 if __name__ == "__main__":
     # Test the research workflow
     result = research_question("What are the latest developments in renewable energy?", "quick")
-    print(json.dumps(result, indent=2))
\ No newline at end of file
+    print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
\ No newline at end of file